@@ -0,0 +1,167 @@
+"""
+Tagit 2.0 - Automated Git Tagging and Version Management Tool
+
+Resolution cache helpers shared by the --print-version fast path of
+tagit.py and by tagit_core.py, which imports them from here rather than
+from the entry point.
+"""
+
+import os
+
+# Everything here runs on the --print-version fast path, so it may only use
+# os and modules imported inside the functions that are cheap to load; in
+# particular not json or re, which the fast path must not pull in.
+
+RESOLUTION_CACHE_DIR = 'tagit-cache'
+
+
+def locate_git_dir(repo_path: str):
+    """Git directory of repo_path, following the '.git' file of worktrees, or None"""
+    dot_git = os.path.join(repo_path, '.git')
+    if os.path.isdir(dot_git):
+        return dot_git
+    if os.path.isfile(dot_git):
+        try:
+            with open(dot_git, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+        except (OSError, UnicodeDecodeError):
+            return None
+        if content.startswith('gitdir:'):
+            git_dir = os.path.join(repo_path, content[len('gitdir:'):].strip())
+            if os.path.isdir(git_dir):
+                return os.path.realpath(git_dir)
+    return None
+
+
+def locate_common_dir(git_dir: str) -> str:
+    """Worktrees share refs with the main repository via 'commondir'"""
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+            common = f.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return git_dir
+    return os.path.realpath(os.path.join(git_dir, common))
+
+
+def ref_state_digest(git_dir: str, common_dir: str):
+    """Digest of HEAD, its branch, packed-refs, loose tags and grafts, None if unreadable
+
+    Any new commit on the checked-out branch or any tag change alters
+    the digest; other refs (e.g. remote-tracking branches) do not. So
+    does deepening a shallow clone (shallow, info/grafts), which changes
+    the history describe sees without touching a ref.
+    """
+    import hashlib
+
+    def is_object_id(value: str) -> bool:
+        return len(value) in (40, 64) and all(c in '0123456789abcdef' for c in value)
+
+    if os.path.exists(os.path.join(common_dir, 'reftable')):
+        return None
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), 'r', encoding='utf-8') as f:
+            head = f.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if head.startswith('ref:'):
+        head_ref = head[len('ref:'):].strip()
+    elif is_object_id(head):
+        head_ref = None
+    else:
+        return None
+
+    tags = {}
+    for root, _dirs, files in os.walk(os.path.join(common_dir, 'refs', 'tags')):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = f.read().strip()
+            except (OSError, UnicodeDecodeError):
+                return None
+            if value.startswith('ref:'):
+                continue
+            if not is_object_id(value):
+                return None
+            tags[os.path.relpath(path, common_dir).replace(os.sep, '/')] = value
+
+    digest = hashlib.sha256(f'HEAD {head_ref or head}\n'.encode('utf-8'))
+    for name in ([head_ref] if head_ref else []) + ['packed-refs', 'shallow', 'info/grafts']:
+        try:
+            with open(os.path.join(common_dir, name), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = b''
+        except OSError:
+            return None
+        digest.update(f'{name} {len(content)}\n'.encode('utf-8') + content)
+    for refname in sorted(tags):
+        digest.update(f'{refname} {tags[refname]}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def version_cache_key(
+    version_mode: str,
+    tag_format: str,
+    initial_version: str,
+    count_paths=(),
+    overrides=(None, None, None, None)
+) -> str:
+    """Key of a computed version in the resolution cache, a hex digest"""
+    import hashlib
+    options = [version_mode, tag_format, initial_version, *overrides, list(count_paths)]
+    return hashlib.sha256(repr(options).encode('utf-8')).hexdigest()
+
+
+PRINT_VERSION_OPTIONS = ('--tag-format', '--version-mode', '--initial-version', '--count-path')
+
+
+def cached_print_version(argv):
+    """Version for --print-version from the resolution cache, None on a miss
+
+    Only reads files below .git. Any option that the fast path does not
+    know falls back to the normal path, which also fills the cache.
+    """
+    options = {
+        '--tag-format': 'v{major}.{minor}.{patch}',
+        '--version-mode': 'commits',
+        '--initial-version': '0.1.0',
+    }
+    count_paths = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == '--print-version':
+            continue
+        name, sep, value = argument.partition('=')
+        if name not in PRINT_VERSION_OPTIONS:
+            return None
+        if not sep:
+            value = next(arguments, None)
+            if value is None:
+                return None
+        if name == '--count-path':
+            count_paths.append(value)
+        else:
+            options[name] = value
+
+    git_dir = locate_git_dir(os.getcwd())
+    if git_dir is None:
+        return None
+    state = ref_state_digest(git_dir, locate_common_dir(git_dir))
+    if state is None:
+        return None
+    key = version_cache_key(
+        options['--version-mode'], options['--tag-format'], options['--initial-version'],
+        count_paths
+    )
+    # Lines of '<key> <version>', see ResolutionCache.store_version; the last one counts
+    version = None
+    try:
+        with open(os.path.join(git_dir, RESOLUTION_CACHE_DIR, f'{state}.versions'), 'r', encoding='utf-8') as f:
+            for line in f:
+                line_key, sep, line_version = line.rstrip('\n').partition(' ')
+                if sep and line_key == key:
+                    version = line_version
+    except (OSError, UnicodeDecodeError):
+        return None
+    return version or None
@@ -0,0 +1,64 @@
+"""Repositories and helpers shared by the tests, which run tagit as a command"""
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TAGIT = ROOT / 'tagit.py'
+
+# Tests of the classes import tagit from the checkout
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Commits and tags of git and tagit need an identity on any machine"""
+    for role in ('AUTHOR', 'COMMITTER'):
+        monkeypatch.setenv(f'GIT_{role}_NAME', 'tagit')
+        monkeypatch.setenv(f'GIT_{role}_EMAIL', 'tagit@example.com')
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', '1')
+
+
+@pytest.fixture
+def git() -> Callable[..., str]:
+    """Run git in a repository and return its output"""
+    def run(repo: Path, *args: str) -> str:
+        return subprocess.run(
+            ['git', *args], cwd=repo, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    return run
+
+
+@pytest.fixture
+def tagit() -> Callable[..., subprocess.CompletedProcess]:
+    """Run tagit in a repository"""
+    def run(repo: Path, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, str(TAGIT), *args], cwd=repo, check=check, capture_output=True, text=True
+        )
+    return run
+
+
+@pytest.fixture
+def make_repo(git: Callable[..., str]) -> Callable[[Path], Path]:
+    """Create a repository two commits past v0.1.0, with VERSION="0.1.0" in version.txt"""
+    def make(path: Path) -> Path:
+        path.mkdir()
+        git(path, 'init', '-q')
+        (path / 'version.txt').write_text('VERSION="0.1.0"\n')
+        git(path, 'add', 'version.txt')
+        git(path, 'commit', '-q', '-m', 'init')
+        git(path, 'tag', '-a', 'v0.1.0', '-m', 'v0.1.0')
+        for number in range(2):
+            git(path, 'commit', '-q', '--allow-empty', '-m', f'change {number}')
+        return path
+    return make
+
+
+@pytest.fixture
+def repo(tmp_path: Path, make_repo: Callable[[Path], Path]) -> Path:
+    return make_repo(tmp_path / 'repo')
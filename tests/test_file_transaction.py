@@ -0,0 +1,50 @@
+"""FileTransaction recovery after a crash between swapping files"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from tagit import FileOperationError, FileTransaction, Replacement
+
+
+def crash_during_commit(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Commit a transaction over a.txt and b.txt that dies before b.txt is swapped in"""
+    (tmp_path / 'a.txt').write_bytes(b'Version: 0.1.9\n')
+    (tmp_path / 'b.txt').write_bytes(b'Version: 0.1.9\n')
+    transaction = FileTransaction(tmp_path / 'journal')
+    transaction.stage(str(tmp_path / 'a.txt'), b'Version: 0.2.0\n')
+    transaction.stage_patch(str(tmp_path / 'b.txt'), [Replacement(9, 14, b'0.1.9', b'0.2.0', 1, 'v')])
+
+    def die(self, entry, restore) -> None:
+        # Like a kill: nothing the transaction could catch and roll back
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(FileTransaction, '_write_patches', die)
+        with pytest.raises(KeyboardInterrupt):
+            transaction.commit()
+    assert (tmp_path / 'a.txt').read_bytes() == b'Version: 0.2.0\n'
+    return tmp_path / 'journal'
+
+
+def test_recover_rolls_back_a_half_committed_update(tmp_path: Path, monkeypatch) -> None:
+    journal_dir = crash_during_commit(tmp_path, monkeypatch)
+
+    assert FileTransaction.recover(journal_dir)
+
+    assert (tmp_path / 'a.txt').read_bytes() == b'Version: 0.1.9\n'
+    assert (tmp_path / 'b.txt').read_bytes() == b'Version: 0.1.9\n'
+    assert sorted(os.listdir(tmp_path)) == ['a.txt', 'b.txt', 'journal']
+    assert not FileTransaction.recover(journal_dir)
+
+
+def test_recover_keeps_a_file_edited_after_the_crash(tmp_path: Path, monkeypatch) -> None:
+    journal_dir = crash_during_commit(tmp_path, monkeypatch)
+    (tmp_path / 'a.txt').write_bytes(b'Version: 7.7.7\n')
+
+    with pytest.raises(FileOperationError, match='a.txt changed'):
+        FileTransaction.recover(journal_dir)
+
+    assert (tmp_path / 'a.txt').read_bytes() == b'Version: 7.7.7\n'
+    assert (tmp_path / 'a.txt.tagit-orig').read_bytes() == b'Version: 0.1.9\n'
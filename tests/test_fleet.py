@@ -0,0 +1,30 @@
+"""tagit fleet releases every repository of a list, whatever happens to the others"""
+
+import json
+from pathlib import Path
+
+
+def test_fleet_releases_the_good_repositories(tmp_path: Path, make_repo, git, tagit) -> None:
+    for name in ('a', 'b'):
+        make_repo(tmp_path / name)
+    (tmp_path / 'not-a-repo').mkdir()
+    (tmp_path / 'list.jsonl').write_text(
+        '{"path": "a"}\n'
+        '"not-a-repo"\n'
+        '{"path": "b", "tag_format": "release-{major}.{minor}.{patch}"}\n'
+        '{broken\n'
+    )
+
+    result = tagit(tmp_path, 'fleet', '--repos-file', 'list.jsonl', '-f', 'version.txt', '-j', '2',
+                   check=False)
+
+    assert result.returncode == 1
+    results = {line['repo']: line for line in map(json.loads, result.stdout.splitlines())}
+    assert set(results) == {'a', 'b', 'not-a-repo', 'list.jsonl:4'}
+    assert results['a']['status'] == 'ok' and results['a']['tag'] == 'v0.1.2'
+    assert results['b']['status'] == 'ok' and results['b']['tag'] == 'release-0.1.2'
+    assert results['not-a-repo']['status'] == 'error'
+    assert results['list.jsonl:4']['status'] == 'error'
+    for name, tag in (('a', 'v0.1.2'), ('b', 'release-0.1.2')):
+        assert git(tmp_path / name, 'tag', '--points-at', 'HEAD') == tag
+        assert (tmp_path / name / 'version.txt').read_text() == 'VERSION="0.1.2"\n'
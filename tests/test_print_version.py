@@ -0,0 +1,84 @@
+"""The --print-version fast path must answer a cache hit without loading tagit_core"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from conftest import ROOT, TAGIT
+
+# Modules that only the full implementation needs
+HEAVY_MODULES = {'tagit_core', 'subprocess', 'argparse', 're', 'socketserver'}
+
+# Allowed on top of a bare interpreter: a cache hit costs a few milliseconds
+# here, compiling tagit_core alone takes several times this bound
+MAX_OVERHEAD = 0.015
+
+
+def run(repo: Path, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=repo, check=check, capture_output=True, text=True
+    )
+
+
+def best_time(repo: Path, *args: str, runs: int = 5) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(repo, *args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.fixture
+def cached_repo(repo: Path) -> Path:
+    """The repository with its version cached by a first run"""
+    assert run(repo, str(TAGIT), '--print-version').stdout == '0.1.2\n'
+    return repo
+
+
+def test_cache_hit_skips_heavy_imports(cached_repo: Path) -> None:
+    result = run(cached_repo, '-X', 'importtime', str(TAGIT), '--print-version')
+    assert result.stdout == '0.1.2\n'
+    imported = {
+        line.rsplit('|', 1)[-1].strip()
+        for line in result.stderr.splitlines() if line.startswith('import time:')
+    }
+    assert imported, result.stderr
+    assert not HEAVY_MODULES & imported
+
+
+def test_cache_miss_after_commit(cached_repo: Path, git) -> None:
+    git(cached_repo, 'commit', '-q', '--allow-empty', '-m', 'change 2')
+    assert run(cached_repo, str(TAGIT), '--print-version').stdout == '0.1.3\n'
+
+
+def test_cache_hit_wall_time(cached_repo: Path) -> None:
+    bare = best_time(cached_repo, '-c', 'pass')
+    hit = best_time(cached_repo, str(TAGIT), '--print-version')
+    assert hit < bare + MAX_OVERHEAD, f"cache hit took {hit:.3f}s, bare interpreter {bare:.3f}s"
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='needs symlinks')
+def test_installed_behind_a_symlink(repo: Path, tmp_path: Path) -> None:
+    lib = tmp_path / 'lib' / 'tagit'
+    lib.mkdir(parents=True)
+    for name in ('tagit.py', 'tagit_cache.py', 'tagit_core.py'):
+        shutil.copy(ROOT / name, lib)
+    (tmp_path / 'bin').mkdir()
+    os.symlink(lib / 'tagit.py', tmp_path / 'bin' / 'tagit')
+
+    for _ in range(2):  # cache miss, then hit
+        assert run(repo, str(tmp_path / 'bin' / 'tagit'), '--print-version').stdout == '0.1.2\n'
+
+
+def test_missing_implementation_is_reported(repo: Path, tmp_path: Path) -> None:
+    shutil.copy(TAGIT, tmp_path)
+    result = run(repo, str(tmp_path / 'tagit.py'), '--print-version', check=False)
+    assert result.returncode == 1
+    assert 'tagit_cache.py not found' in result.stderr
+    assert 'Traceback' not in result.stderr
@@ -0,0 +1,42 @@
+"""Version reservations with --reserve"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def test_reserve_twice_tags_once(repo: Path, git, tagit) -> None:
+    for _ in range(2):
+        tagit(repo, '-f', 'version.txt', '--reserve')
+    assert git(repo, 'tag').split() == ['v0.1.0', 'v0.1.2']
+    assert git(repo, 'rev-list', '--count', 'HEAD') == '4'
+    # The tag guards the version now
+    assert git(repo, 'for-each-ref', 'refs/tagit/reservations/') == ''
+
+
+def test_reserve_twice_on_remote_tags_once(repo: Path, tmp_path: Path, git, tagit) -> None:
+    git(repo, 'clone', '-q', '--bare', str(repo), str(tmp_path / 'origin.git'))
+    git(repo, 'remote', 'add', 'origin', str(tmp_path / 'origin.git'))
+    for _ in range(2):
+        tagit(repo, '-f', 'version.txt', '--reserve', 'origin')
+    assert git(repo, 'tag').split() == ['v0.1.0', 'v0.1.2']
+    reservations = git(tmp_path / 'origin.git', 'for-each-ref', '--format=%(refname)', 'refs/tagit/')
+    assert reservations.split() == ['refs/tagit/reservations/v0.1.2']
+
+
+def test_concurrent_reservations_get_distinct_versions(repo: Path, tmp_path: Path, git, tagit) -> None:
+    origin = tmp_path / 'origin.git'
+    git(tmp_path, 'clone', '-q', '--bare', str(repo), str(origin))
+    clones = []
+    for number in range(4):
+        clone = tmp_path / f'clone{number}'
+        git(tmp_path, 'clone', '-q', str(origin), str(clone))
+        clones.append(clone)
+
+    # Every clone computes v0.1.2; only one may get it from origin
+    with ThreadPoolExecutor(len(clones)) as pool:
+        list(pool.map(lambda clone: tagit(clone, '-f', 'version.txt', '--reserve', 'origin'), clones))
+
+    tags = [git(clone, 'tag', '--points-at', 'HEAD') for clone in clones]
+    assert len(set(tags)) == len(clones), tags
+    reservations = git(origin, 'for-each-ref', '--format=%(refname:lstrip=3)', 'refs/tagit/reservations/')
+    assert sorted(reservations.split()) == sorted(tags)
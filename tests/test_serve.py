@@ -0,0 +1,32 @@
+"""Answers of tagit serve, whose caches are shared by the request threads"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tagit import logger, serve_request
+
+
+def test_concurrent_dry_runs_follow_new_commits(repo: Path, git) -> None:
+    request = {'op': 'dry-run', 'repo': str(repo), 'file': ['version.txt']}
+
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(serve_request, [request] * 8))
+    assert {response['result']['tag'] for response in responses} == {'v0.1.2'}, responses
+    assert (repo / 'version.txt').read_text() == 'VERSION="0.1.0"\n'
+
+    git(repo, 'commit', '-q', '--allow-empty', '-m', 'change 2')
+    assert serve_request(request)['result']['tag'] == 'v0.1.3'
+    resolved = serve_request({'op': 'resolve', 'repo': str(repo)})
+    assert resolved['result']['version'] == '0.1.3'
+
+
+def test_dry_run_sees_worktree_changes(repo: Path, caplog) -> None:
+    request = {'op': 'dry-run', 'repo': str(repo), 'file': ['version.txt']}
+    caplog.set_level('DEBUG', logger=logger.name)
+    assert serve_request(request)['ok']
+    assert "Clean check 'full': clean" in caplog.text
+
+    caplog.clear()
+    (repo / 'untracked.txt').write_text('new\n')
+    assert serve_request(request)['ok']
+    assert "Clean check 'full': dirty" in caplog.text